@@ -1,9 +1,33 @@
 """Tools to git deboogie on."""
-from pprint import pformat
+import sys
+from collections import OrderedDict
+from functools import partial
+from inspect import getargspec, isfunction
+from itertools import chain
+from logging import (CRITICAL, DEBUG, Handler, Logger, LogRecord, NullHandler,
+                     StreamHandler)
+from pprint import pformat, PrettyPrinter
+from Queue import Queue, Empty
 from sys import stdout
-from StringIO import StringIO
+from threading import Thread
+from types import CodeType, FunctionType
 
-def get_debug_logger(name, strm=None):
+# Shared by the ``pp`` attribute of every debug logger.
+_pp_pformat = PrettyPrinter(indent=2).pformat
+
+# Debug loggers already built by ``get_debug_logger``,
+# keyed by ``(name, id(strm), queued)``.
+# These, and the handlers and listeners below, hold on to their streams,
+# which keeps the ids from being reused -- and the streams from being freed.
+_debug_loggers = {}
+
+# Handlers writing to each stream, keyed by ``id(strm)``.
+_stream_handlers = {}
+
+# Background writers for queued debug loggers, keyed by ``id(strm)``.
+_queue_listeners = {}
+
+def get_debug_logger(name, strm=None, queued=False):
     """Creates a basic debug log function with prettyprint capabilities.
 
     A basic logger is created.
@@ -11,15 +35,26 @@ def get_debug_logger(name, strm=None):
     The logger itself is returned as ``return.logger``.
     The handler is returned as ``return.handler``.
     A pretty-printing version of the log function is returned as ``return.pp``.
+    A function to flush pending output is returned as ``return.flush``.
+
+    If `queued` is true, messages are handed off to a background thread
+    which does the writing, so logging calls return without waiting on I/O.
+    Output then lags behind the calls until ``return.flush`` is called.
+
+    Loggers, and the handlers behind them, are kept around for reuse
+    for the life of the process, and so are the streams they write to.
+    Passing a fresh stream every time, like a new ``StringIO`` per test,
+    means each one, along with everything written to it, is never freed.
 
     >>> from sys import stdout
     >>> debug = get_debug_logger('boogie', strm=stdout)
     >>> debug('Git yer gittin it on on and boogie!')
     Git yer gittin it on on and boogie!
     >>> debug.pp(debug.__dict__)  # doctest: +ELLIPSIS
-    { 'handler': <logging.StreamHandler object at 0x...>,
+    { 'flush': <bound method StreamHandler.flush of <...>>,
+      'handler': <logging.StreamHandler object at 0x...>,
       'logger': <logging.Logger object at 0x...>,
-      'pp': <function <lambda> at 0x...>}
+      'pp': <functools.partial object at 0x...>}
 
     Subsequent loggers do not issue duplicate output.
     >>> debug_two = get_debug_logger('boogie', strm=stdout)
@@ -27,40 +62,220 @@ def get_debug_logger(name, strm=None):
     Hit me one time!  OW!
 
     How does that work?
-    >>> debug.logger is debug_two.logger
+    Loggers are cached by name and stream,
+    so asking again just gets the same one back.
+    >>> debug_two is debug
+    True
+
+    A different stream gets a different logger.
+    >>> from StringIO import StringIO
+    >>> get_debug_logger('boogie', strm=StringIO()) is debug
     False
 
-    So logging.Logger(name) doesn't always return the same object.
+    Loggers writing to the same stream share a handler.
+    >>> get_debug_logger('woogie', strm=stdout).handler is debug.handler
+    True
+
+    Queued output shows up once it's flushed.
+    >>> qdebug = get_debug_logger('boogie', strm=stdout, queued=True)
+    >>> qdebug('Boogie later.'); qdebug.flush()
+    Boogie later.
+
+    A failed write is reported through the handler
+    and doesn't hold up later flushes.
+    >>> import logging
+    >>> logging.raiseExceptions = False  # Keep the report out of the way.
+    >>> closed = StringIO(); closed.close()
+    >>> broken = get_debug_logger('boogie', strm=closed, queued=True)
+    >>> broken('Nobody home.'); broken.flush()
+
+    A failed flush doesn't get anything written twice.
+    >>> class Unflushable(object):
+    ...     def __init__(self):
+    ...         self.writes = []
+    ...     def write(self, s):
+    ...         self.writes.append(s)
+    ...     def flush(self):
+    ...         raise IOError('Stuck.')
+    >>> unflushable = Unflushable()
+    >>> stuck = get_debug_logger('boogie', strm=unflushable, queued=True)
+    >>> stuck('one'); stuck('two'); stuck.flush()
+    >>> ''.join(unflushable.writes)
+    'one\\ntwo\\n'
+    >>> logging.raiseExceptions = True
     """
-    from logging import Logger, StreamHandler, DEBUG
+    if strm is None:
+        strm = sys.stderr
+    key = (name, id(strm), queued)
+    try:
+        return _debug_loggers[key]
+    except KeyError:
+        debug = _debug_loggers[key] = _build_debug_logger(name, strm, queued)
+        return debug
+
+def _build_debug_logger(name, strm, queued):
+    """Does the actual construction for ``get_debug_logger``."""
     logger = Logger(name)
-    debug = lambda *args, **kwargs: logger.debug(*args, **kwargs)
+    # A partial calls straight through to the method
+    # and, unlike it, can carry the other attributes.
+    debug = partial(logger.debug)
     debug.logger = logger
 
-    handler = StreamHandler(stream=strm)
+    if queued:
+        handler = _QueueHandler(_get_queue_listener(strm))
+    else:
+        handler = _get_stream_handler(strm)
     logger.addHandler(handler)
     debug.handler = handler
+    debug.flush = handler.flush
 
-    from pprint import PrettyPrinter
-    pformat = PrettyPrinter(indent=2).pformat
-    debug.pp = lambda *args, **kwargs: debug(pformat(*args, **kwargs))
+    debug.pp = partial(_pp, debug)
     return debug
 
+def _pp(debug, *args, **kwargs):
+    """Logs the pretty-printed arguments to `debug`."""
+    debug(_pp_pformat(*args, **kwargs))
+
+def _get_stream_handler(strm):
+    try:
+        return _stream_handlers[id(strm)]
+    except KeyError:
+        handler = _stream_handlers[id(strm)] = StreamHandler(stream=strm)
+        return handler
+
+
+class _QueueListener(object):
+    """Writes records from a queue to a stream from a background thread.
+
+    Whatever has piled up in the queue is written out in one go,
+    followed by a single flush.
+    If the write fails, the records are written one by one,
+    and any that can't be are reported through the handler's ``handleError``.
+    If the flush fails, every record in the batch is reported that way.
+    """
+    def __init__(self, strm):
+        self.queue = Queue()
+        self.handler = _get_stream_handler(strm)
+        thread = Thread(target=self._drain, name='deboogie-queue-listener')
+        thread.daemon = True
+        thread.start()
+
+    def _drain(self):
+        get, get_nowait = self.queue.get, self.queue.get_nowait
+        task_done = self.queue.task_done
+        handler = self.handler
+        while True:
+            records = [get()]
+            try:
+                while True:
+                    records.append(get_nowait())
+            except Empty:
+                pass
+            handler.acquire()
+            try:
+                self._write(records)
+            finally:
+                handler.release()
+                for r in records:
+                    task_done()
+
+    def _write(self, records):
+        handler = self.handler
+        try:
+            handler.stream.write(''.join(r.msg + '\n' for r in records))
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self._write_each(records)
+            return
+        try:
+            handler.flush()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            for r in records:
+                handler.handleError(r)
+
+    def _write_each(self, records):
+        handler = self.handler
+        for r in records:
+            try:
+                handler.stream.write(r.msg + '\n')
+                handler.flush()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                handler.handleError(r)
+
+    def flush(self):
+        """Blocks until everything queued so far has been written."""
+        self.queue.join()
+
+def _get_queue_listener(strm):
+    try:
+        return _queue_listeners[id(strm)]
+    except KeyError:
+        listener = _queue_listeners[id(strm)] = _QueueListener(strm)
+        return listener
+
+class _QueueHandler(Handler):
+    """Formats records and queues them for a ``_QueueListener``.
+
+    Formatting happens here rather than in the listener's thread
+    so that the message reflects its arguments as they were when logged.
+    The formatted message replaces the record's own.
+    """
+    def __init__(self, listener):
+        Handler.__init__(self)
+        self.listener = listener
+        self.put = listener.queue.put
+
+    def emit(self, record):
+        try:
+            record.msg = self.format(record)
+            record.args = record.exc_info = None
+            self.put(record)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+    def flush(self):
+        self.listener.flush()
 
-class NullStream(StringIO):
-    def write(*args):
-        pass
-null_stream = NullStream()
 
 def get_null_logger(name):
-    from StringIO import StringIO
-    return get_debug_logger(name, null_stream)
+    """Creates a debug log function which ignores everything.
+
+    It has the same attributes as one from ``get_debug_logger``,
+    but messages are dropped without ever being formatted.
+
+    >>> null = get_null_logger('hush')
+    >>> null('Nobody hears this.')
+    >>> null.pp(range(3))
+    >>> null.logger.isEnabledFor(CRITICAL)
+    False
+    """
+    logger = Logger(name)
+    # Lets tracewrap know not to bother formatting anything for it.
+    logger.setLevel(CRITICAL + 1)
+    def null(*args, **kwargs):
+        pass
+    null.logger = logger
+
+    handler = NullHandler()
+    logger.addHandler(handler)
+    null.handler = handler
+    null.flush = handler.flush
+
+    null.pp = null
+    return null
 null_log = get_null_logger('null')
 null_log.__name__ = 'null_log'
 
 
 # expanded version of iterrabble.iterlog
-def iterdebug(name, it, stringifier=str, strm=None):
+def iterdebug(name, it, stringifier=str, strm=None, chunk=1):
     """Log iterable elements to `strm` as they pass through this node.
 
     >>> from sys import stdout
@@ -72,19 +287,330 @@ def iterdebug(name, it, stringifier=str, strm=None):
     jive 2
     jive 3
     [1, 2, 3]
+    >>> list(iterdebug('jives', jives, strm=stdout))
+    1
+    2
+    3
+    [1, 2, 3]
+
+    Elements are written straight to the logger's stream,
+    skipping the per-record trip through the logging machinery.
+    As with logging, anything the stringifier returns is made a string,
+    and trouble writing is reported through the handler's ``handleError``
+    rather than getting in the way of the iteration.
+    >>> list(iterdebug('doubles', (1, 2), stringifier=lambda i: i * 2,
+    ...                strm=stdout))
+    2
+    4
+    [1, 2]
+    >>> import logging
+    >>> logging.raiseExceptions = False  # Keep the report out of the way.
+    >>> from StringIO import StringIO
+    >>> closed = StringIO(); closed.close()
+    >>> list(iterdebug('jives', jives, strm=closed))
+    [1, 2, 3]
+    >>> logging.raiseExceptions = True
+
+    A `chunk` greater than 1 batches the writes, `chunk` lines at a time.
+    Output then lags behind the elements:
+    stragglers aren't written until `it` runs out or the generator is closed.
+    >>> for j in iterdebug('jives', jives, strm=stdout, chunk=2):
+    ...     print 'got', j
+    got 1
+    1
+    2
+    got 2
+    got 3
+    3
+    """
+    handler = get_debug_logger(name, strm=strm).handler
+    if chunk <= 1:
+        return _iterdebug_each(name, it, stringifier, handler)
+    return _iterdebug_chunked(name, it, stringifier, handler, chunk)
+
+def _iterdebug_each(name, it, stringifier, handler):
+    """Does the work for ``iterdebug``, writing each line as it comes."""
+    write, flush = handler.stream.write, handler.stream.flush
+    # A single line goes out in a single write, which can't be split up,
+    # so there's no need for the handler's lock.
+    if stringifier is str:
+        # String formatting converts and terminates the line in one go.
+        for i in it:
+            line = '%s\n' % (i,)
+            try:
+                write(line)
+                flush()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                _report_write_error(handler, name, [line])
+            yield i
+    else:
+        for i in it:
+            line = '%s\n' % (stringifier(i),)
+            try:
+                write(line)
+                flush()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                _report_write_error(handler, name, [line])
+            yield i
+
+def _iterdebug_chunked(name, it, stringifier, handler, chunk):
+    """Does the work for ``iterdebug``, writing `chunk` lines at a time."""
+    write, flush = handler.stream.write, handler.stream.flush
+    lines = []
+    append = lines.append
+    def dump():
+        # The handler's lock keeps several lines from being interleaved
+        # with other loggers writing through the same handler, queued or not.
+        handler.acquire()
+        try:
+            try:
+                write(''.join(lines))
+                flush()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                _report_write_error(handler, name, lines)
+        finally:
+            handler.release()
+        del lines[:]
+    try:
+        if stringifier is str:
+            for i in it:
+                append('%s\n' % (i,))
+                if len(lines) >= chunk:
+                    dump()
+                yield i
+        else:
+            for i in it:
+                append('%s\n' % (stringifier(i),))
+                if len(lines) >= chunk:
+                    dump()
+                yield i
+    finally:
+        if lines:
+            dump()
+
+def _report_write_error(handler, name, lines):
+    """Reports trouble writing `lines` directly, as logging would have."""
+    handler.handleError(LogRecord(name, DEBUG, '<iterdebug>', 0,
+                                  lines, None, None))
+
+def _array_lines(arr):
+    """Stringifies the elements of `arr`; compiled by Numba if it's around."""
+    lines = []
+    for x in arr:
+        lines.append(str(x))
+    return lines
+
+# ``_array_lines`` compiled by Numba: None until asked for,
+# False if Numba isn't available or couldn't compile it.
+_jit_array_lines = None
+
+# The base class of Numba's errors, once it's been imported.
+_NumbaError = None
+
+def _get_jit_array_lines():
+    global _jit_array_lines, _NumbaError
+    if _jit_array_lines is None:
+        try:
+            from numba import njit
+            try:
+                from numba.core.errors import NumbaError
+            except ImportError:
+                from numba.errors import NumbaError
+        except ImportError:
+            _jit_array_lines = False
+        else:
+            _NumbaError = NumbaError
+            _jit_array_lines = njit(cache=True)(_array_lines)
+    return _jit_array_lines
+
+def iterdebug_array(name, arr, stringifier=str, strm=None):
+    """Like ``iterdebug``, but faster for one-dimensional integer arrays.
+
+    If Numba is available, `arr` is a NumPy integer array,
+    and `stringifier` is ``str``,
+    the elements are stringified in compiled code right away,
+    and all written out in one go when iteration starts.
+    Anything else is handed off to ``iterdebug``,
+    as is everything from then on if Numba fails to compile the loop.
+
+    >>> from sys import stdout
+    >>> list(iterdebug_array('jives', (1, 2, 3), strm=stdout))
+    1
+    2
+    3
+    [1, 2, 3]
+
+    The compiled path can be tried out without NumPy or Numba
+    by standing in for them with the uncompiled loop and a fake array.
+    >>> import deboogie
+    >>> class Dtype(object):
+    ...     kind = 'i'
+    >>> class Jives(tuple):
+    ...     dtype, ndim = Dtype, 1
+    >>> deboogie._jit_array_lines = deboogie._array_lines
+    >>> for j in iterdebug_array('jives', Jives((1, 2, 3)), strm=stdout):
+    ...     print 'got', j
+    1
+    2
+    3
+    got 1
+    got 2
+    got 3
+
+    If the loop won't compile, it's not tried again.
+    >>> class CompileError(Exception):
+    ...     pass
+    >>> def uncompilable(arr):
+    ...     raise CompileError
+    >>> deboogie._jit_array_lines = uncompilable
+    >>> deboogie._NumbaError = CompileError
+    >>> for j in iterdebug_array('jives', Jives((1, 2)), strm=stdout):
+    ...     print 'got', j
+    1
+    got 1
+    2
+    got 2
+    >>> deboogie._jit_array_lines
+    False
+    >>> deboogie._jit_array_lines = deboogie._NumbaError = None
     """
-    debug = get_debug_logger(name, strm=strm)
-    for i in iter(it):
-        debug(stringifier(i))
+    global _jit_array_lines
+    dtype = getattr(arr, 'dtype', None)
+    if (stringifier is str and dtype is not None and dtype.kind in 'iu'
+        and arr.ndim == 1):
+        array_lines = _get_jit_array_lines()
+        if array_lines:
+            # Numba compiles on the first call,
+            # so that's where it lets on if it can't.
+            try:
+                lines = array_lines(arr)
+            except _NumbaError:
+                _jit_array_lines = False
+            else:
+                return _iterdebug_jit(name, arr, lines, strm)
+    return iterdebug(name, arr, stringifier, strm)
+
+def _iterdebug_jit(name, arr, lines, strm):
+    handler = get_debug_logger(name, strm=strm).handler
+    if lines:
+        handler.acquire()
+        try:
+            try:
+                handler.stream.write('\n'.join(lines) + '\n')
+                handler.stream.flush()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                _report_write_error(handler, name, lines)
+        finally:
+            handler.release()
+    for i in arr:
         yield i
 
+# The most recently used labellers built by ``tuplabel``,
+# keyed by ``(name, f)``.
+_tuplabels = OrderedDict()
+_max_tuplabels = 128
+
 def tuplabel(name, f=None):
-    """The produced function wraps a tuple with a label and a function call."""
-    def label(tup):
+    """The produced function wraps a tuple with a label and a function call.
+
+    The same labeller is handed back for the same `name` and `f`,
+    for as long as it's among the 128 most recently asked for.
+    >>> tuplabel('->') is tuplabel('->')
+    True
+    >>> tuplabel('->', len)((1, 2))
+    ('->', 2)
+    """
+    key = (name, f)
+    try:
+        label = _tuplabels.pop(key)
+    except KeyError:
+        label = _TupLabel(name, f)
+        if len(_tuplabels) >= _max_tuplabels:
+            _tuplabels.popitem(last=False)
+    except TypeError:
+        # Unhashable arguments just don't get remembered.
+        return _TupLabel(name, f)
+    _tuplabels[key] = label
+    return label
+
+class _TupLabel(object):
+    """A labeller, as produced by ``tuplabel``."""
+    __slots__ = ('name', 'f')
+
+    def __init__(self, name, f=None):
+        self.name = name
+        self.f = f
+
+    def __call__(self, tup):
+        f = self.f
         if f:
             tup = f(tup)
-        return (name, tup)
-    return label
+        return (self.name, tup)
+
+def memoize_fmt(fmt, size=1024):
+    """Wraps the format function `fmt` to remember results by object identity.
+
+    Up to `size` of the most recently formatted objects are remembered.
+    They're held onto while they're remembered, so their ids stay unique.
+
+    This is only correct for objects that don't change after being formatted.
+    As a rough guard, only hashable objects are remembered;
+    anything else just gets passed along to `fmt`.
+
+    >>> calls = []
+    >>> def fmt(obj):
+    ...     calls.append(obj)
+    ...     return repr(obj)
+    >>> cached = memoize_fmt(fmt)
+    >>> point = (1, 2)
+    >>> cached(point), cached(point), cached([3]), cached([3])
+    ('(1, 2)', '(1, 2)', '[3]', '[3]')
+    >>> calls
+    [(1, 2), [3], [3]]
+    """
+    cache = OrderedDict()
+    def cached(obj):
+        key = id(obj)
+        try:
+            entry = cache.pop(key)
+        except KeyError:
+            try:
+                hash(obj)
+            except TypeError:
+                return fmt(obj)
+            entry = (obj, fmt(obj))
+            if len(cache) >= size:
+                cache.popitem(last=False)
+        cache[key] = entry
+        return entry[1]
+    return cached
+
+cached_pformat = memoize_fmt(pformat)
+
+# How the default formatters lay out tracewrap's inputs and outputs.
+_in_template = '-> %r args=%r kwargs=%r'
+_out_template = '<- %r'
+
+def default_infmt(a):
+    """Formats a tracewrap input tuple on one line.
+
+    >>> default_infmt((('function', len), ('args', ('boogie',)),
+    ...                ('kwargs', {})))
+    "-> <built-in function len> args=('boogie',) kwargs={}"
+    """
+    (_, f), (_, args), (_, kwargs) = a
+    return _in_template % (f, args, kwargs)
+
+def default_outfmt(a):
+    return _out_template % (a,)
 
 # The default logger for tracewrap-produced decorators.
 default_log = get_debug_logger('tracewrap')
@@ -96,11 +622,172 @@ stdout_log.__name__ = 'stdout_log'
 def null_fmt(*a, **k):
     return None
 
-def tracewrap(infmt=lambda a: pformat(tuplabel('->')(a)),
-              outfmt=lambda a: pformat(tuplabel('<-')(a)),
-              inlog=default_log, outlog=default_log):
+def _always_enabled():
+    return True
+
+def _log_enabled(log):
+    """Returns a function telling whether `log` will actually log anything.
+
+    Only loggers from ``get_debug_logger`` can be asked;
+    any other log function is assumed to always be listening.
+    """
+    logger = getattr(log, 'logger', None)
+    if logger is None:
+        return _always_enabled
+    return partial(logger.isEnabledFor, DEBUG)
+
+# Source for the functions produced by tracewrap-produced decorators.
+# The free names are supplied by ``_make_trace``.
+_trace_templates = {
+    'split': """\
+def trace(%(params)s):
+    if inenabled():
+        inlog(%(infmt)s)
+    ret = f(%(params)s)
+    if outenabled():
+        outlog(%(outfmt)s)
+    return ret
+""",
+    # Inputs are logged along with outputs, or on their own if `f` raises.
+    'joined': """\
+def trace(%(params)s):
+    returned = False
+    try:
+        ret = f(%(params)s)
+        returned = True
+    finally:
+        if not returned and inenabled():
+            inlog(%(infmt)s)
+    if inenabled():
+        inlog(joined_template %% (f, %(args)s, %(kwargs)s, ret))
+    return ret
+""",
+}
+
+_trace_payload = ("(('function', f),"
+                  " ('args', %(args)s), ('kwargs', %(kwargs)s))")
+
+# Locals of the templates, which parameters mustn't clash with either.
+_trace_locals = frozenset(['ret', 'returned'])
+
+# The default formatting is done in place.
+_trace_infmts = {
+    'default': "in_template %% (f, %(args)s, %(kwargs)s)",
+    'custom': "infmt(%(payload)s)",
+}
+
+_trace_outfmts = {
+    'default': "out_template % (ret,)",
+    'custom': "outfmt(ret)",
+}
+
+# Wrapped functions taking more arguments than this get a generic trace.
+_max_trace_params = 8
+
+def _trace_signature(f, reserved):
+    """Returns the parameter list, args and kwargs sources for tracing `f`.
+
+    Functions with a fixed set of plain named parameters are traced
+    by a function with the same parameters,
+    so calls to it don't have to pack up an args tuple and a kwargs dict.
+    Anything else is traced through ``*args, **kwargs``.
+    """
+    generic = ('*args, **kwargs', 'args', 'kwargs')
+    if not isfunction(f):
+        return generic
+    names, varargs, varkw, defaults = getargspec(f)
+    if (varargs or varkw or len(names) > _max_trace_params
+        or not all(isinstance(n, str) for n in names)
+        or reserved.intersection(names)):
+        return generic
+    params = ', '.join(names)
+    return params, '(%s)' % (params + ',' if names else ''), '{}'
+
+# Code objects already compiled by ``_make_trace``, keyed by source.
+_trace_code = {}
+
+def _make_trace(f, infmt, outfmt, inlog, outlog, inenabled, outenabled,
+                joined=False):
+    """Builds the tracing version of `f`.
+
+    The function's source is specialized to the formatters it's given,
+    so the usual case doesn't go through ``default_infmt``
+    or ``default_outfmt``,
+    and to the parameters of `f`, as described for ``_trace_signature``.
+    If `joined` is true, inputs and outputs are formatted together
+    in the default way and logged to `inlog`.
+    """
+    namespace = dict(__name__=__name__, f=f, in_template=_in_template,
+                     out_template=_out_template,
+                     joined_template=_in_template + '\n' + _out_template,
+                     infmt=infmt, outfmt=outfmt, inlog=inlog, outlog=outlog,
+                     inenabled=inenabled, outenabled=outenabled)
+    params, args, kwargs = _trace_signature(
+            f, _trace_locals.union(namespace))
+    payload = _trace_payload % {'args': args, 'kwargs': kwargs}
+    infmt_source = _trace_infmts[
+            'default' if infmt is default_infmt or joined else 'custom'] % {
+            'args': args, 'kwargs': kwargs, 'payload': payload}
+    outfmt_source = _trace_outfmts[
+            'default' if outfmt is default_outfmt else 'custom']
+    source = _trace_templates['joined' if joined else 'split'] % {
+            'params': params, 'args': args, 'kwargs': kwargs,
+            'infmt': infmt_source, 'outfmt': outfmt_source}
+    try:
+        code = _trace_code[source]
+    except KeyError:
+        code = _trace_code[source] = compile(source, '<tracewrap>', 'exec')
+    exec(code, namespace)
+    trace = namespace['trace']
+    if params != '*args, **kwargs':
+        # Calls that don't fit the signature are turned away by Python
+        # before trace gets to log them, so it had better name `f`.
+        trace = _renamed(trace, f.__name__)
+        trace.__defaults__ = f.__defaults__
+    trace.__doc__ = """Trace output function.
+
+    Inputs and outputs are passed as a single tuple to
+    ``{0}`` and ``{1}`` respectively.
+    """.format(infmt, outfmt)
+    return trace
+
+def _renamed(func, name):
+    """Returns a copy of `func` called `name`, right down to its code."""
+    c = func.__code__
+    code = CodeType(c.co_argcount, c.co_nlocals, c.co_stacksize, c.co_flags,
+                    c.co_code, c.co_consts, c.co_names, c.co_varnames,
+                    c.co_filename, name, c.co_firstlineno, c.co_lnotab,
+                    c.co_freevars, c.co_cellvars)
+    return FunctionType(code, func.__globals__, name,
+                        func.__defaults__, func.__closure__)
+
+def tracewrap(infmt=default_infmt, outfmt=default_outfmt,
+              inlog=default_log, outlog=default_log, enabled=None,
+              joined=False):
     """Decorator factory to log function inputs and outputs.
 
+    Formatting is skipped when the log function wouldn't log anything.
+    This is decided by calling `enabled` with no arguments;
+    by default, the loggers behind `inlog` and `outlog` are asked
+    whether they're enabled for DEBUG messages.
+
+    The default formatters put inputs and outputs on a line each,
+    using ``repr`` rather than pretty-printing.
+
+    A wrapped function with only plain named parameters
+    is traced by a function with the same signature,
+    so every argument is logged positionally, defaults included.
+    A call that doesn't fit the signature fails before anything is logged,
+    with an error naming the wrapped function.
+
+    If `joined` is true and the defaults are used for both formatters,
+    with `inlog` and `outlog` the same,
+    inputs and outputs are logged together in a single message
+    once the function returns.
+    This saves a round of formatting and logging per call,
+    but means inputs aren't logged until the wrapped function is done.
+    If it raises, the inputs are logged on their own.
+
     First we have to do some setup to break doctest's fourth wall.
         >>> # We want to catch the default output of this function,
         >>> # which is directed to standard error.
@@ -124,14 +811,8 @@ def tracewrap(infmt=lambda a: pformat(tuplabel('->')(a)),
         ...                           'simply_wrapped_func arg 2',
         ...                           wfkw1='wrapped_func kwarg 1')
         ... # doctest: +ELLIPSIS
-        ('->',
-         (('function', <function simply_wrapped_func at 0x...>),
-          ('args', ('simply_wrapped_func arg 1', 'simply_wrapped_func arg 2')),
-          ('kwargs', {'wfkw1': 'wrapped_func kwarg 1'})))
-        ('<-',
-         ('simply_wrapped_func returning (wa, wk)',
-          ('simply_wrapped_func arg 1', 'simply_wrapped_func arg 2'),
-          {'wfkw1': 'wrapped_func kwarg 1'}))
+        -> <function simply_wrapped_func at 0x...> args=(...) kwargs={...}
+        <- ('simply_wrapped_func returning (wa, wk)', ...)
         >>> pprint(ret)
         ('simply_wrapped_func returning (wa, wk)',
          ('simply_wrapped_func arg 1', 'simply_wrapped_func arg 2'),
@@ -159,21 +840,76 @@ def tracewrap(infmt=lambda a: pformat(tuplabel('->')(a)),
         ('wrapped_func returning (wa, wk)',
          ('wrapped_func arg 1', 'wrapped_func arg 2'),
          {'wfkw1': 'wrapped_func kwarg 1'})
+
+    Loggers that won't log don't get anything formatted for them:
+        >>> import logging
+        >>> quiet_log = get_debug_logger('quiet', strm=sys.stdout)
+        >>> quiet_log.logger.setLevel(logging.INFO)
+        >>> def loudfmt(data):
+        ...     print 'Formatting', data
+        >>> @tracewrap(infmt=loudfmt, outfmt=loudfmt,
+        ...            inlog=quiet_log, outlog=quiet_log)
+        ... def hush():
+        ...     return 'shh'
+        >>> hush()
+        'shh'
+
+    A function with a fixed signature gets its arguments logged in order:
+        >>> @tracewrap()
+        ... def add(x, y=1):
+        ...     return x + y
+        >>> add(2) # doctest: +ELLIPSIS
+        -> <function add at 0x...> args=(2, 1) kwargs={}
+        <- 3
+        3
+        >>> add(y=3, x=4) # doctest: +ELLIPSIS
+        -> <function add at 0x...> args=(4, 3) kwargs={}
+        <- 7
+        7
+        >>> add()
+        Traceback (most recent call last):
+        ...
+        TypeError: add() takes at least 1 argument (0 given)
+        >>> tracewrap()(lambda x: x)()
+        Traceback (most recent call last):
+        ...
+        TypeError: <lambda>() takes exactly 1 argument (0 given)
+
+    With `joined`, each call gets a single log message:
+        >>> @tracewrap(joined=True)
+        ... def shout(word):
+        ...     return word.upper()
+        >>> shout('boogie') # doctest: +ELLIPSIS
+        -> <function shout at 0x...> args=('boogie',) kwargs={}
+        <- 'BOOGIE'
+        'BOOGIE'
+        >>> try:
+        ...     shout(None)
+        ... except AttributeError:
+        ...     print 'No boogie.'
+        ... # doctest: +ELLIPSIS
+        -> <function shout at 0x...> args=(None,) kwargs={}
+        No boogie.
+
+    Parameters named like the tracing function's own locals are left alone:
+        >>> @tracewrap(joined=True)
+        ... def echo(ret, returned):
+        ...     return ret, returned
+        >>> echo(5, 42) # doctest: +ELLIPSIS
+        -> <function echo at 0x...> args=(5, 42) kwargs={}
+        <- (5, 42)
+        (5, 42)
     """
+    if enabled is None:
+        inenabled, outenabled = _log_enabled(inlog), _log_enabled(outlog)
+    else:
+        inenabled = outenabled = enabled
+
+    joined = (joined and inlog is outlog
+              and infmt is default_infmt and outfmt is default_outfmt)
     def tracer(f):
-        def trace(*args, **kwargs):
-            """Trace output function.
-
-            Inputs and outputs are passed as a single tuple to
-            ``{0}`` and ``{1}`` respectively.
-            """.format(infmt, outfmt)
-
-            inlog(infmt((('function', f),
-                       ('args', args), ('kwargs', kwargs))))
-            ret = f(*args, **kwargs)
-            outlog(outfmt(ret))
-            return ret
-        return trace
+        return _make_trace(f, infmt, outfmt, inlog, outlog,
+                           inenabled, outenabled, joined)
     return tracer
 
 def null_tracewrap(infmt=None, inlog=None,
@@ -195,7 +931,6 @@ def null_tracewrap(infmt=None, inlog=None,
     >>> ret
     'noise'
     """
-    from itertools import chain
     args = [(fmt if fmt else null_fmt if not log else pformat,
              log if log else null_log if not fmt else default_log)
             for fmt, log in ((infmt, inlog), (outfmt, outlog))]